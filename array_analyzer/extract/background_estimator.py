@@ -1,4 +1,5 @@
 import numpy as np
+from numpy.polynomial import chebyshev
 import itertools
 
 
@@ -40,59 +41,81 @@ class BackgroundEstimator2D:
 
         nbr_blocks_x = im_shape[0] // self.block_size
         nbr_blocks_y = im_shape[1] // self.block_size
-        sample_coords = np.zeros((nbr_blocks_x * nbr_blocks_y, 2),
-                                 dtype=np.float64)
-        sample_values = np.zeros((nbr_blocks_x * nbr_blocks_y, ),
-                                 dtype=np.float64)
-        for x in range(nbr_blocks_x):
-            for y in range(nbr_blocks_y):
-                idx = y * nbr_blocks_x + x
-                sample_coords[idx, :] = [x * self.block_size + (self.block_size - 1) / 2,
-                                         y * self.block_size + (self.block_size - 1) / 2]
-                sample_values[idx] = np.median(
-                    im[x * self.block_size:(x + 1) * self.block_size,
-                       y * self.block_size:(y + 1) * self.block_size]
-                )
+        # Reshape image so that each row contains the pixels of one block,
+        # ordered with block index y * nbr_blocks_x + x
+        blocks = im[:nbr_blocks_x * self.block_size,
+                    :nbr_blocks_y * self.block_size]
+        blocks = blocks.reshape(
+            nbr_blocks_x, self.block_size, nbr_blocks_y, self.block_size,
+        )
+        blocks = blocks.transpose(2, 0, 1, 3).reshape(
+            nbr_blocks_x * nbr_blocks_y, -1,
+        )
+        sample_values = np.median(blocks, axis=1).astype(np.float64)
+        block_centers_x = np.arange(nbr_blocks_x) * self.block_size + \
+            (self.block_size - 1) / 2
+        block_centers_y = np.arange(nbr_blocks_y) * self.block_size + \
+            (self.block_size - 1) / 2
+        sample_coords = np.stack([
+            np.tile(block_centers_x, nbr_blocks_y),
+            np.repeat(block_centers_y, nbr_blocks_x),
+        ], axis=1)
         return sample_coords, sample_values
 
     def fit_polynomial_surface_2d(self,
                                   sample_coords,
                                   sample_values,
-                                  im_shape):
+                                  im_shape,
+                                  dtype=np.float64):
         """
         Given coordinates and corresponding values, this function will fit a
         2D polynomial of given order, then create a surface of given shape.
+        The polynomial is expressed in a Chebyshev basis over coordinates
+        scaled to [-1, 1].
 
         :param np.array sample_coords: 2D sample coords (nbr of points, 2)
         :param np.array sample_values: Corresponding intensity values (nbr points,)
         :param tuple im_shape:         Shape of desired output surface (height, width)
+        :param np.dtype dtype:         Data type of output surface
 
         :return np.array poly_surface: 2D surface of shape im_shape
         """
         assert (self.order + 1)*(self.order + 2)/2 <= len(sample_values), \
             "Can't fit a higher degree polynomial than there are sampled values"
+        # Scale coordinates to [-1, 1], where the Chebyshev basis is
+        # well conditioned
+        scales = 2. / np.maximum(np.array(im_shape[:2]) - 1, 1)
+        sample_coords = sample_coords * scales - 1.
         # Number of coefficients is determined by (order + 1)*(order + 2)/2
         orders = np.arange(self.order + 1)
-        variable_matrix = np.zeros(
-            (sample_coords.shape[0], int((self.order + 1)*(self.order + 2)/2)),
-        )
-        order_pairs = list(itertools.product(orders, orders))
         # sum of orders of x,y <= order of the polynomial
-        variable_iterator = itertools.filterfalse(lambda x: sum(x) > self.order, order_pairs)
-        for idx, (m, n) in enumerate(variable_iterator):
-            variable_matrix[:, idx] = sample_coords[:, 0] ** n * sample_coords[:, 1] ** m
+        order_pairs = [(m, n) for m, n in itertools.product(orders, orders)
+                       if m + n <= self.order]
+        x_terms = chebyshev.chebvander(sample_coords[:, 0], self.order)
+        y_terms = chebyshev.chebvander(sample_coords[:, 1], self.order)
+        variable_matrix = np.stack(
+            [x_terms[:, n] * y_terms[:, m] for m, n in order_pairs],
+            axis=1,
+        )
         # Least squares fit of the points to the polynomial
         coeffs, _, _, _ = np.linalg.lstsq(variable_matrix, sample_values, rcond=-1)
-        # Create a grid of image (x, y) coordinates
-        x_mesh, y_mesh = np.meshgrid(np.linspace(0, im_shape[1] - 1, im_shape[1]),
-                                     np.linspace(0, im_shape[0] - 1, im_shape[0]))
-        # Reconstruct the surface from the coefficients
-        poly_surface = np.zeros(im_shape, np.float)
-        order_pairs = list(itertools.product(orders, orders))
-        # sum of orders of x,y <= order of the polynomial
-        variable_iterator = itertools.filterfalse(lambda x: sum(x) > self.order, order_pairs)
-        for coeff, (m, n) in zip(coeffs, variable_iterator):
-            poly_surface += coeff * x_mesh ** m * y_mesh ** n
+        # The surface is separable in rows and columns:
+        # surface = row_terms @ coeff_matrix @ col_terms.T
+        coeff_matrix = np.zeros((self.order + 1, self.order + 1))
+        for coeff, (m, n) in zip(coeffs, order_pairs):
+            coeff_matrix[n, m] = coeff
+        row_terms = chebyshev.chebvander(
+            np.arange(im_shape[0]) * scales[0] - 1.,
+            self.order,
+        )
+        col_terms = chebyshev.chebvander(
+            np.arange(im_shape[1]) * scales[1] - 1.,
+            self.order,
+        )
+        poly_surface = np.dot(
+            np.dot(row_terms, coeff_matrix).astype(dtype),
+            col_terms.T.astype(dtype),
+        )
 
         return poly_surface
 
@@ -102,7 +125,8 @@ class BackgroundEstimator2D:
         To background correct an image, divide it by background.
 
         :param np.array im: 2D grayscale image
-        :return np.array background: Background image
+        :return np.array background: Background image, single precision
+            if im is single precision
         """
         # Get grid of coordinates with median intensity values
         coords, values = self.sample_block_medians(im=im)
@@ -111,6 +135,7 @@ class BackgroundEstimator2D:
             sample_coords=coords,
             sample_values=values,
             im_shape=im.shape,
+            dtype=np.float32 if im.dtype == np.float32 else np.float64,
         )
         # Normalize by mean
         if self.normalize:
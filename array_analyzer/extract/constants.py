@@ -84,6 +84,9 @@ MEAN_POINT = (0, 0)
 SCALE_MEAN = 1.
 ANGLE_MEAN = 0.
 
+# Number of worker processes for well registration, None uses all CPUs
+NBR_WORKERS = None
+
 # Requirement of minimum number of detected spots
 MIN_NBR_SPOTS = 5
 # Minimum detected spot percentage of spot ROI area
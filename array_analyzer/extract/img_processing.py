@@ -237,8 +237,11 @@ class SpotDetector:
                  min_circularity=.1,
                  min_convexity=.5,
                  min_dist_between_blobs=10,
-                 min_repeatability=2):
+                 min_repeatability=2,
+                 downsample=2):
         """
+        :param dict imaging_params: Imaging parameters (spot width, pixel size,
+            number of grid rows and columns)
         :param int min_thresh: Minimum threshold
         :param int max_thresh: Maximum threshold
         :param float min_circularity: Minimum circularity of spots
@@ -247,16 +250,20 @@ class SpotDetector:
             spots for them to be called as different spots
         :param int min_repeatability: minimal number of times the same spot has to be
             detected at different thresholds
+        :param int downsample: Factor by which images are downsampled before
+            detection. Spot size and distance parameters are scaled accordingly
         """
 
+        self.downsample = downsample
         self.min_thresh = min_thresh
         self.max_thresh = max_thresh
-        self.min_dist_between_blobs = min_dist_between_blobs
+        self.min_dist_between_blobs = min_dist_between_blobs / downsample
         self.min_repeatability = min_repeatability
         self.min_circularity = min_circularity
         self.min_convexity = min_convexity
+        # Spot size in downsampled pixels
         self.sigma_gauss = int(np.round(imaging_params['spot_width'] /
-                                imaging_params['pixel_size'] / 4))
+                                imaging_params['pixel_size'] / 4 / downsample))
         self.min_area = 4 * self.sigma_gauss ** 2
         self.max_area = 50 * self.min_area
         self.nbr_expected_spots = imaging_params['rows'] * imaging_params['columns']
@@ -317,6 +324,8 @@ class SpotDetector:
         Use OpenCVs simple blob detector (thresholdings and grouping by properties)
         to detect all dark spots in the image. First filter with a Laplacian of
         Gaussian with sigma matching spots to enhance spots in image.
+        Detection is done on a downsampled image and the spot coordinates
+        are mapped back to the input image.
 
         :param np.array im: uint8 mage containing spots
         :param int margin: Pixel margin around image edged where spots should be
@@ -324,11 +333,21 @@ class SpotDetector:
         :param float im_mean: Set normalized image to fixed mean
         :param float im_std: Set normalized image to fixed std
         :param int max_intensity: Maximum image intensity (default uint8)
-        :return np.array spot_coords: row, col coordinates of spot centroids
-            (nbr spots x 2)
+        :return np.array spot_coords: row, col float32 coordinates of spot
+            centroids (nbr spots x 2)
         """
+        # Downsample image, spots are large enough to keep their centroids
+        im_small = im
+        if self.downsample > 1:
+            im_small = cv.resize(
+                im,
+                None,
+                fx=1 / self.downsample,
+                fy=1 / self.downsample,
+                interpolation=cv.INTER_AREA,
+            )
         # First invert image to detect peaks
-        im_norm = (max_intensity - im) / max_intensity
+        im_norm = (max_intensity - im_small) / max_intensity
         # Filter with Laplacian of Gaussian
         im_norm = cv.filter2D(im_norm, -1, self.log_filter)
         # Normalize
@@ -341,15 +360,18 @@ class SpotDetector:
         # Detect peaks in filtered image
         keypoints = self.blob_detector.detect(im_norm)
 
-        spot_coords = np.zeros((len(keypoints), 2))
-        # Remove outliers and convert to np.array
+        # Convert keypoint (x, y) to (row, col) coordinates
+        spot_coords = np.array(
+            [keypoint.pt[::-1] for keypoint in keypoints],
+            dtype=np.float32,
+        ).reshape(-1, 2)
+        # Map pixel centers in downsampled image back to input image
+        spot_coords = (spot_coords + .5) * self.downsample - .5
+        # Remove outliers
         row_max, col_max = im.shape
-        idx = 0
-        for keypoint in range(len(keypoints)):
-            pt = keypoints[keypoint].pt
-            if margin < pt[0] < row_max - margin and margin < pt[1] < col_max - margin:
-                spot_coords[idx, 0] = pt[1]
-                spot_coords[idx, 1] = pt[0]
-                idx += 1
-        spot_coords = spot_coords[:idx, :]
+        inside_margin = (spot_coords[:, 0] > margin) & \
+            (spot_coords[:, 0] < row_max - margin) & \
+            (spot_coords[:, 1] > margin) & \
+            (spot_coords[:, 1] < col_max - margin)
+        spot_coords = spot_coords[inside_margin, :]
         return spot_coords
@@ -354,29 +354,30 @@ def populate_array_antigen(arr, csv_antigens_):
     return arr
 
 
-def rerun_xl_od(well_names, well_xlsx_path, rerun_names, xlsx_writer):
+def rerun_xl_od(well_names, well_xlsx_path, rerun_names):
     """
-    Load stats_per_well excel file and copy over existing well sheets
+    Load stats_per_well excel file and get existing well sheets
     before rerunning some of the wells.
 
     :param list well_names: Well names (e.g. ['B12', 'C2'])
     :param str well_xlsx_path: Full path to well stats xlsx sheet
     :param list rerun_names: Names of wells to be rerun
-    :param pd.ExcelWriter xlsx_writer: Pandas excel writer
+    :return dict existing_well_dfs: Well name keys and well stats dataframe
+        values for wells that won't be rerun
     """
     rerun_set = set(rerun_names)
     assert rerun_set.issubset(well_names), \
         "All rerun wells can't be found in input directory"
     assert os.path.isfile(well_xlsx_path),\
         "Can't find stats_per_well excel: {}".format(well_xlsx_path)
-    ordered_dict = pd.read_excel(well_xlsx_path, sheet_name=None)
+    ordered_dict = pd.read_excel(well_xlsx_path, sheet_name=None, index_col=0)
     written_wells = list(ordered_dict.keys())
     written_wells.remove('antigens')
     # Find the difference between the sets
     existing_wells = natsort.natsorted(
         list(set(written_wells) - rerun_set),
     )
-    # Write existing wells to well stats
+    existing_well_dfs = {}
     for well_name in existing_wells:
-        well_df = pd.DataFrame(ordered_dict[well_name])
-        well_df.to_excel(xlsx_writer, sheet_name=well_name)
+        existing_well_dfs[well_name] = pd.DataFrame(ordered_dict[well_name])
+    return existing_well_dfs
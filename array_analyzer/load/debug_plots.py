@@ -111,16 +111,14 @@ def plot_od(spots_df,
     :param int nbr_grid_cols: Number of grid columns
     :param str output_name: Path to image to be written minus exension
     """
-    intensity_well = np.empty((nbr_grid_rows, nbr_grid_cols))
+    grid_rows = spots_df['grid_row'].values.astype(int)
+    grid_cols = spots_df['grid_col'].values.astype(int)
+    intensity_well = np.full((nbr_grid_rows, nbr_grid_cols), np.nan)
     bg_well = intensity_well.copy()
     od_well = intensity_well.copy()
-
-    for r in np.arange(nbr_grid_rows):
-        for c in np.arange(nbr_grid_cols):
-            df_row = spots_df[(spots_df['grid_row'] == r) & (spots_df['grid_col'] == c)]
-            intensity_well[r, c] = df_row['intensity_median']
-            bg_well[r, c] = df_row['bg_median']
-            od_well[r, c] = df_row['od_norm']
+    intensity_well[grid_rows, grid_cols] = spots_df['intensity_median'].values
+    bg_well[grid_rows, grid_cols] = spots_df['bg_median'].values
+    od_well[grid_rows, grid_cols] = spots_df['od_norm'].values
 
     plt.figure(figsize=(6, 1.5))
     plt.subplot(131)
@@ -152,11 +150,14 @@ def plot_background_overlay(im, background, output_name):
     :param np.array background: 2D grayscale background corresponding to image
     :param str output_name: Path and image name minus extension
     """
-    im_stack = np.stack([background, im, background], axis=2)
-    cv.imwrite(
-        output_name + "_crop_bg_overlay.png",
-        (255 * im_stack).astype('uint8'),
-    )
+    # Write scaled channels directly into uint8 overlay
+    im_overlay = np.empty(im.shape + (3,), dtype=np.uint8)
+    im_scaled = np.multiply(background, 255, dtype=np.float32)
+    im_overlay[..., 0] = im_scaled
+    im_overlay[..., 2] = im_overlay[..., 0]
+    np.multiply(im, 255, out=im_scaled)
+    im_overlay[..., 1] = im_scaled
+    cv.imwrite(output_name + "_crop_bg_overlay.png", im_overlay)
 
 
 def plot_registration(image,
@@ -187,11 +188,18 @@ def plot_registration(image,
     col_max = int(min(im_shape[1], np.max(all_coords[:, 1]) + margin))
     im_roi = im[row_min:row_max, col_min:col_max]
 
+    # Shift all coordinates to ROI in place and split them back into views
+    all_coords -= [row_min - 1, col_min - 1]
+    spot_roi, grid_roi, reg_roi = np.split(
+        all_coords,
+        [len(spot_coords), len(spot_coords) + len(grid_coords)],
+    )
+
     im_roi = cv.cvtColor(im_roi, cv.COLOR_GRAY2RGB)
     plt.imshow(im_roi)
-    plt.plot(spot_coords[:, 1] - col_min + 1, spot_coords[:, 0] - row_min + 1, 'rx', ms=8)
-    plt.plot(grid_coords[:, 1] - col_min + 1, grid_coords[:, 0] - row_min + 1, 'b+', ms=8)
-    plt.plot(reg_coords[:, 1] - col_min + 1, reg_coords[:, 0] - row_min + 1, 'g.', ms=8)
+    plt.plot(spot_roi[:, 1], spot_roi[:, 0], 'rx', ms=8)
+    plt.plot(grid_roi[:, 1], grid_roi[:, 0], 'b+', ms=8)
+    plt.plot(reg_roi[:, 1], reg_roi[:, 0], 'g.', ms=8)
     plt.axis('off')
     fig_save = plt.gcf()
     fig_save.savefig(output_name + '_registration.png', bbox_inches='tight')
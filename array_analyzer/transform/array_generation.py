@@ -94,8 +94,8 @@ def get_spot_intensity(coords, im, background, search_range=2):
 
     # Array of SpotRegionprop objects to hold ROIs
     spot_props = txt_parser.create_array(n_rows, n_cols, dtype=object)
-    # Dataframe to hold spot metrics for the well
-    spots_df = pd.DataFrame(columns=constants.SPOT_DF_COLS)
+    # List of spot metrics for the well, converted to a dataframe at the end
+    spot_dicts = []
     row_col_iter = itertools.product(np.arange(n_rows), np.arange(n_cols))
     for count, (row_idx, col_idx) in enumerate(row_col_iter):
         coord = coords[count, :]
@@ -158,7 +158,8 @@ def get_spot_intensity(coords, im, background, search_range=2):
                 bbox=bbox,
                 centroid=coord,
             )
-        spots_df = spots_df.append(spot_prop.spot_dict, ignore_index=True)
+        spot_dicts.append(spot_prop.spot_dict)
         spot_props[row_idx, col_idx] = spot_prop
 
+    spots_df = pd.DataFrame(spot_dicts, columns=constants.SPOT_DF_COLS)
     return spots_df, spot_props
@@ -1,6 +1,7 @@
 import cv2 as cv
 import logging
 import numpy as np
+from scipy import spatial
 
 import array_analyzer.extract.constants as constants
 
@@ -64,12 +65,39 @@ def icp(source, target, max_iterate=50, matrix_diff=1.):
     return t_matrix[:2]
 
 
+def create_grid_template(nbr_grid_rows, nbr_grid_cols, spot_dist):
+    """
+    Generate spot grid centered at origin based on spot distance and spot
+    layout (nbr rows and cols). The template only has to be translated to
+    be placed in an image.
+
+    :param int nbr_grid_rows: Number of grid rows
+    :param int nbr_grid_cols: Number of grid columns
+    :param float spot_dist: Distance between spots in pixels
+    :return np.array grid_template: (row, col) coordinates for reference
+        spots centered at origin (nbr x 2)
+    """
+    # Half the grid height and width
+    row_span = spot_dist * (nbr_grid_rows - 1) / 2
+    col_span = spot_dist * (nbr_grid_cols - 1) / 2
+    row_vals = np.linspace(-row_span, row_span, nbr_grid_rows)
+    col_vals = np.linspace(-col_span, col_span, nbr_grid_cols)
+    grid_cols, grid_rows = np.meshgrid(col_vals, row_vals)
+    grid_template = np.vstack([grid_rows.flatten(), grid_cols.flatten()]).T
+    return grid_template
+
+
 class ParticleFilter:
     """
     Framework for registering grid points to spot coordinates using a
     particle filter approach.
     """
-    def __init__(self, spot_coords, im_shape, fiducials_idx, random_seed=None):
+    def __init__(self,
+                 spot_coords,
+                 im_shape,
+                 fiducials_idx,
+                 grid_template=None,
+                 random_seed=None):
         """
         Initialize by creating grid coordinates and particles.
 
@@ -77,21 +105,33 @@ class ParticleFilter:
         :param tuple im_shape: Image shape
         :param list fiducials_idx: Indices of grid coordinates which are considered
             fiducials
+        :param np.array grid_template: Optional grid centered at origin, see
+            create_grid_template. Created from constants if None.
         :param int random_seed: Optional random seed for deterministic runs
         """
         self.logger = logging.getLogger(constants.LOG_NAME)
         self.im_shape = im_shape
         self.fiducials_idx = fiducials_idx
+        if grid_template is None:
+            grid_template = create_grid_template(
+                nbr_grid_rows=constants.params['rows'],
+                nbr_grid_cols=constants.params['columns'],
+                spot_dist=constants.SPOT_DIST_PIX,
+            )
+        self.grid_template = grid_template
         # Initialize random number generator
         np.random.seed(random_seed)
 
         self.spot_coords = spot_coords
+        # kd-tree for nearest neighbor lookup among spot coords, reused
+        # between particle filter runs
+        self.spot_tree = spatial.cKDTree(self.spot_coords, leafsize=16)
         self.grid_coords = self.create_reference_grid()
         self.fiducial_coords = self.grid_coords[self.fiducials_idx, :]
         self.registered_coords = None
         self.registration_ok = True
         self.registered_dist = None
-        self.standard_devs = np.array(constants.STDS)
+        self.standard_devs = np.array(constants.STDS, dtype=np.float32)
         self.nbr_particles = constants.NBR_PARTICLES
         self.t_matrix = None
         self.mean_point = constants.MEAN_POINT
@@ -101,33 +141,14 @@ class ParticleFilter:
 
     def create_reference_grid(self):
         """
-        Generate initial spot grid based on image scale, center point, spot distance
-        and spot layout (nbr rows and cols).
+        Generate initial spot grid by placing the grid template at the image
+        center.
 
         :return np.array grid_coords: (row, col) coordinates for reference spots (nbr x 2)
         """
-        nbr_grid_rows = constants.params['rows']
-        nbr_grid_cols = constants.params['columns']
-        # Distance between spots in pixels
-        spot_dist = constants.SPOT_DIST_PIX
         # Assume center point is the center of image as starting point
-        center_point = tuple((self.im_shape[0] / 2, self.im_shape[1] / 2))
-        start_row = center_point[0] - spot_dist * (nbr_grid_rows - 1) / 2
-        start_col = center_point[1] - spot_dist * (nbr_grid_cols - 1) / 2
-        row_vals = np.linspace(
-            start_row,
-            start_row + (nbr_grid_rows - 1) * spot_dist,
-            nbr_grid_rows,
-        )
-        col_vals = np.linspace(
-            start_col,
-            start_col + (nbr_grid_cols - 1) * spot_dist,
-            nbr_grid_cols,
-        )
-        grid_cols, grid_rows = np.meshgrid(col_vals, row_vals)
-        grid_cols = grid_cols.flatten()
-        grid_rows = grid_rows.flatten()
-        grid_coords = np.vstack([grid_rows.T, grid_cols.T]).T
+        center_point = np.array([self.im_shape[0] / 2, self.im_shape[1] / 2])
+        grid_coords = self.grid_template + center_point
         return grid_coords
 
     def create_gaussian_particles(self):
@@ -141,9 +162,10 @@ class ParticleFilter:
         :param float scale_mean: Mean scale of translation
         :param float angle_mean: Mean angle of translation estimation
 
-        :return np.array particles: Set of particle coordinates (nbr particles x 4)
+        :return np.array particles: Set of float32 particle coordinates
+            (nbr particles x 4)
         """
-        particles = np.empty((self.nbr_particles, 4))
+        particles = np.empty((self.nbr_particles, 4), dtype=np.float32)
         particles[:, 0] = self.mean_point[0] +\
                           (np.random.randn(self.nbr_particles) * self.standard_devs[0])
         particles[:, 1] = self.mean_point[1] +\
@@ -168,6 +190,26 @@ class ParticleFilter:
                             [-b, a, particle[1]]])
         return t_matrix
 
+    @staticmethod
+    def get_translation_matrices(particles):
+        """
+        Create 2D translation matrices from x, y, scale and angle for
+        a set of particles.
+
+        :param np.array particles: Particle parameters (nbr particles x 4)
+        :return np.array t_matrices: 2D translation matrices (nbr particles x 2 x 3)
+        """
+        a = particles[:, 3] * np.cos(particles[:, 2] * np.pi / 180)
+        b = particles[:, 3] * np.sin(particles[:, 2] * np.pi / 180)
+        t_matrices = np.empty((particles.shape[0], 2, 3), dtype=particles.dtype)
+        t_matrices[:, 0, 0] = a
+        t_matrices[:, 0, 1] = b
+        t_matrices[:, 0, 2] = particles[:, 0]
+        t_matrices[:, 1, 0] = -b
+        t_matrices[:, 1, 1] = a
+        t_matrices[:, 1, 2] = particles[:, 1]
+        return t_matrices
+
     def particle_filter(self,
                         max_iter=100,
                         stop_criteria=.1,
@@ -189,40 +231,38 @@ class ParticleFilter:
         :param int nbr_outliers: If registration hasn't converged, remove worst fitted
             spots when running particle filter
         """
-        # Use kNN module to petrain spot coords
-        dst = self.spot_coords.copy().astype(np.float32)
-        knn = cv.ml.KNearest_create()
-        labels = np.array(range(dst.shape[0])).astype(np.float32)
-        knn.train(dst, cv.ml.ROW_SAMPLE, labels)
         # Make sure we don't have too many outliers
         if nbr_outliers > 0:
-            if len(labels) < nbr_outliers + 5 or self.fiducial_coords.shape[0] < nbr_outliers + 5:
+            if self.spot_coords.shape[0] < nbr_outliers + 5 or \
+                    self.fiducial_coords.shape[0] < nbr_outliers + 5:
                 nbr_outliers = 1
         self.logger.debug(
             "Particle filter, number of outliers: {}".format(nbr_outliers),
         )
-        dists = np.zeros(self.nbr_particles)
+        nbr_fiducials = self.fiducial_coords.shape[0]
+        # Homogeneous fiducial coordinates (nbr fiducials x 3), single
+        # precision like the particles
+        fiducials_h = np.hstack([
+            self.fiducial_coords,
+            np.ones((nbr_fiducials, 1)),
+        ]).astype(np.float32)
         temp_stds = self.standard_devs.copy()
         temp_particles = self.particles.copy()
 
         # Iterate until min dist doesn't change
         min_dist_old = 10 ** 6
         for i in range(max_iter):
-
-            for p in range(self.nbr_particles):
-                particle = temp_particles[p]
-                # Generate transformation matrix
-                t_matrix = self.get_translation_matrix(particle)
-                trans_coords = cv.transform(np.array([self.fiducial_coords]), t_matrix)
-                trans_coords = trans_coords[0].astype(np.float32)
-                # Find nearest spots
-                ret, results, neighbors, dist = knn.findNearest(trans_coords, 1)
-                if nbr_outliers > 0:
-                    # Remove worst fitted spots
-                    dist = np.sort(dist, axis=0)
-                    dist = dist[:-nbr_outliers]
-
-                dists[p] = sum(dist)
+            # Transform fiducials with all particles at once
+            t_matrices = self.get_translation_matrices(temp_particles)
+            trans_coords = np.einsum('nij,kj->nki', t_matrices, fiducials_h)
+            # Find nearest spots (squared distances, nbr particles x nbr fiducials)
+            dist, _ = self.spot_tree.query(trans_coords.reshape(-1, 2))
+            dist = dist.reshape(self.nbr_particles, nbr_fiducials) ** 2
+            if nbr_outliers > 0:
+                # Remove worst fitted spots
+                dist = np.sort(dist, axis=1)
+                dist = dist[:, :-nbr_outliers]
+            dists = np.sum(dist, axis=1)
 
             min_dist = np.min(dists)
             self.logger.debug("Iteration: {} min dist: {}".format(i, min_dist))
@@ -263,14 +303,14 @@ class ParticleFilter:
     def compute_registered_coords(self):
         """
         Given initial grid coordinates and transformation matrix, compute
-        registered grid coordinates
+        registered grid coordinates. The transform is affine so it's applied
+        directly as a rotation/scale followed by a translation.
         :return np.array registered_coords: Registered grid coordinates
         """
         assert self.t_matrix is not None,\
             "Transformation matrix not computed"
-        self.registered_coords = np.squeeze(
-            cv.transform(np.array([self.grid_coords]), self.t_matrix),
-        )
+        self.registered_coords = \
+            np.dot(self.grid_coords, self.t_matrix[:, :2].T) + self.t_matrix[:, 2]
         return self.registered_coords
 
     def check_reg_coords(self):
@@ -9,6 +9,11 @@ import skimage.io as io
 from skimage.color import rgb2grey
 import re
 
+# Well names, e.g. A1 or P24
+_WELL_NAME_RE = re.compile(r'[A-P][0-9]{1,2}')
+# Well images in a flat input directory, e.g. A1.png
+_WELL_IMAGE_RE = re.compile(r'[A-P][0-9]{1,2}\.(png|tif)$')
+
 
 def read_to_grey(path_, wellimage_):
     """
@@ -72,22 +77,17 @@ def get_image_paths(input_dir):
     """
     extensions = ('.png', '.tif')
 
-    image_names = []
-    for ext in extensions:
-        search_str = os.path.join(input_dir,'[A-P][0-9]*'+ext)
-        image_names.extend(glob.glob(search_str, recursive=False))
-
-    # Sort images
-    image_names = natsort.natsorted(image_names)
+    # Assume images are named e.g. A0.png, find them in one directory pass
+    image_names = natsort.natsorted(
+        [im_name for im_name in os.listdir(input_dir)
+         if _WELL_IMAGE_RE.match(im_name)],
+    )
     # Find well names from image paths
     well_images = {}
     if len(image_names) > 0:
-        # Assume images are named e.g. A0.png
         for im_name in image_names:
-            well_name = os.path.basename(im_name)[:-4]
-            # double-check that the file represents a well
-            if re.match(r'[A-P][0-9]{1,2}',well_name):
-                well_images[well_name] = im_name
+            well_name = im_name[:-4]
+            well_images[well_name] = os.path.join(input_dir, im_name)
     else:
         # Micromanager naming convention, find well from subdir name
         image_names = []
@@ -102,7 +102,7 @@ def get_image_paths(input_dir):
             # split again for well name, assume - separation
             well_name = well_name.split('-')[0]
             #  double-check that the file represents a well
-            if re.match(r'[A-P][0-9]{1,2}',well_name):
+            if _WELL_NAME_RE.match(well_name):
                 well_images[well_name] = im_name
 
     # Check that wells are found, refer to docs if not
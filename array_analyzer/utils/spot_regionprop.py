@@ -1,6 +1,5 @@
+import cv2 as cv
 import numpy as np
-import pandas as pd
-from skimage import measure
 from skimage.morphology import disk
 
 import array_analyzer.extract.constants as constants
@@ -82,30 +81,22 @@ class SpotRegionprop:
 
     def generate_props_from_mask(self, image, background, mask, bbox):
         """
-        converts binarized image into region-properties using
-        scikit-image.
+        Computes centroid and bounding box of binarized spot image using
+        OpenCV image moments.
 
         :param np.ndarray image: Large single spot ROI intensity image
         :param np.ndarray background: Background corresponding to image
         :param np.ndarray mask: Binary mask corresponding to image
         :param list bbox: Bounding box of single spot image
         """
-        properties = ('label', 'centroid', 'mean_intensity',
-                      'intensity_image', 'image', 'area', 'bbox')
-        skimage_props = measure.regionprops_table(
-            mask,
-            intensity_image=image,
-            properties=properties,
-        )
-        skimage_props = pd.DataFrame(skimage_props)
-
-        self.spot_dict['centroid_row'] = bbox[0] + skimage_props.at[0, 'centroid-0']
-        self.spot_dict['centroid_col'] = bbox[1] + skimage_props.at[0, 'centroid-1']
-
-        min_row = skimage_props.at[0, 'bbox-0']
-        min_col = skimage_props.at[0, 'bbox-1']
-        max_row = skimage_props.at[0, 'bbox-2']
-        max_col = skimage_props.at[0, 'bbox-3']
+        mask_spot = (mask > 0).astype(np.uint8)
+        moments = cv.moments(mask_spot, binaryImage=True)
+        self.spot_dict['centroid_row'] = bbox[0] + moments['m01'] / moments['m00']
+        self.spot_dict['centroid_col'] = bbox[1] + moments['m10'] / moments['m00']
+        # OpenCV rectangles are (x, y, width, height)
+        min_col, min_row, width, height = cv.boundingRect(mask_spot)
+        max_row = min_row + height
+        max_col = min_col + width
 
         self.spot_dict['bbox_row_min'] = bbox[0] + min_row
         self.spot_dict['bbox_col_min'] = bbox[1] + min_col
@@ -76,8 +76,8 @@ def interp(input_dir, output_dir):
             constants.params['columns']
         )
 
-        # convert to float64
-        im_crop = im_crop / np.iinfo(im_crop.dtype).max
+        # convert to float32
+        im_crop = np.divide(im_crop, np.iinfo(im_crop.dtype).max, dtype=np.float32)
         background = bg_estimator.get_background(im_crop)
         spots_df, spot_props = array_gen.get_spot_intensity(
             coords=crop_coords,
@@ -107,10 +107,11 @@ def interp(input_dir, output_dir):
                       (255 * spot_mask).astype('uint8'))
 
             # Evaluate accuracy of background estimation with green (image), magenta (background) overlay.
-            im_bg_overlay = np.stack([background, im_crop, background], axis=2)
-
-            io.imsave(output_name + "_crop_bg_overlay.png",
-                      (255 * im_bg_overlay).astype('uint8'))
+            debug_plots.plot_background_overlay(
+                im_crop,
+                background,
+                output_name,
+            )
 
             # This plot shows which spots have been assigned what index.
             debug_plots.plot_centroid_overlay(
@@ -5,12 +5,12 @@ import pandas as pd
 import seaborn as sns
 import warnings
 from matplotlib import pyplot as plt
+from joblib import Parallel, delayed
 from natsort import natsorted
 from scipy import optimize as optimization
 from sklearn.metrics import roc_auc_score
 from sklearn.metrics._ranking import _binary_clf_curve
 from sklearn.exceptions import UndefinedMetricWarning
-from sklearn.utils import resample
 
 
 def fourPL(x, A, B, C, D):
@@ -18,16 +18,32 @@ def fourPL(x, A, B, C, D):
     return ((A-D)/(1.0+((x/C)**(B))) + D)
 
 
-def fit2df(df, model):
+def fourPL_jac(x, A, B, C, D):
+    """Jacobian of the 4 parameter logistic function with respect to
+    A, B, C and D (len(x) x 4)"""
+    x_c = x / C
+    u = x_c ** B
+    s = 1.0 + u
+    jac = np.empty((len(x), 4))
+    jac[:, 0] = 1.0 / s
+    jac[:, 1] = -(A - D) * u * np.log(x_c) / s ** 2
+    jac[:, 2] = (A - D) * B * u / (C * s ** 2)
+    jac[:, 3] = 1.0 - 1.0 / s
+    return jac
+
+
+def fit2df(df, model, jac=None):
     """fit model to x, y data in dataframe.
     Return a dataframe with fit x, y for plotting
+    If jac is given, it's used as the analytic Jacobian of model instead
+    of estimating it with finite differences.
     """
     sera = df['serum ID'].unique()
     antigens = df['antigen'].unique()
     secondaries = df['secondary ID'].unique()
 
     keys = itertools.product(sera, antigens, secondaries)
-    df_fit = pd.DataFrame(columns=df.columns)
+    df_fits = []
     for serum, antigen, secondary in keys:
         print('Fitting {}, {}...'.format(serum, antigen))
         sec_dilu_df = df[(df['serum ID']== serum) &
@@ -40,7 +56,8 @@ def fit2df(df, model):
             guess = [0, 1, 5e-4, 1]
             xdata = sub_df['serum dilution'].to_numpy()
             ydata = sub_df['OD'].to_numpy()
-            params, params_covariance = optimization.curve_fit(model, xdata, ydata, guess, bounds=(0, np.inf), maxfev=1e5)
+            params, params_covariance = optimization.curve_fit(
+                model, xdata, ydata, guess, bounds=(0, np.inf), maxfev=1e5, jac=jac)
             x_input = np.logspace(np.log10(np.min(xdata)), np.log10(np.max(xdata)), 50)
             y_fit = fourPL(x_input, *params)
 
@@ -54,7 +71,11 @@ def fit2df(df, model):
                              'secondary dilution',
                              'pipeline']]] * len(df_fit_temp.index), axis=0).reset_index(drop=True)
             df_fit_temp = pd.concat([df_fit_temp, sub_df_expand], axis=1)
-            df_fit = df_fit.append(df_fit_temp)
+            df_fits.append(df_fit_temp)
+    if df_fits:
+        df_fit = pd.concat(df_fits, ignore_index=True)
+    else:
+        df_fit = pd.DataFrame(columns=df.columns)
     print('4PL fitting finished')
     return df_fit
 
@@ -196,6 +217,60 @@ def roc_ci(df, ci):
     cis = sns.utils.ci(df['tpr'], ci).tolist()
     return pd.Series([tpr_mean] + cis, ['True positive rate', 'ci_low', 'ci_high'])
 
+def bootstrap_roc(y_test, y_prob, n_btstp=1000):
+    """
+    Compute ROC curves and AUCs for stratified bootstrap resamples of the data.
+    All resamples are drawn at once as rows of an index matrix, and the ROC
+    curves are computed by sorting each row and taking cumulative sums of
+    true and false positives at each distinct threshold.
+    :param np.array y_test: Boolean array, True for positive samples
+    :param np.array y_prob: Scores (ODs) for the samples
+    :param int n_btstp: Number of bootstrap resamples
+    :return np.array fprs: False positive rates of all bootstrapped ROC curves
+    :return np.array tprs: Corresponding true positive rates
+    :return np.array aucs: Area under the ROC curve for each resample
+    """
+    pos_idx = np.flatnonzero(y_test)
+    neg_idx = np.flatnonzero(~y_test)
+    n_pos = len(pos_idx)
+    n_neg = len(neg_idx)
+    if n_pos == 0 or n_neg == 0:
+        return np.array([]), np.array([]), np.full(n_btstp, np.nan)
+    # Resample positives and negatives separately, one resample per row
+    idx_mat = np.concatenate(
+        [pos_idx[np.random.randint(0, n_pos, (n_btstp, n_pos))],
+         neg_idx[np.random.randint(0, n_neg, (n_btstp, n_neg))]],
+        axis=1,
+    )
+    scores = y_prob[idx_mat]
+    labels = y_test[idx_mat]
+    # Sort scores in decreasing order within each resample
+    sort_idx = np.argsort(-scores, axis=1, kind='mergesort')
+    scores = np.take_along_axis(scores, sort_idx, axis=1)
+    labels = np.take_along_axis(labels, sort_idx, axis=1)
+    tps = np.cumsum(labels, axis=1)
+    fps = np.arange(1, scores.shape[1] + 1) - tps
+    tpr = tps / n_pos
+    fpr = fps / n_neg
+    # Thresholds are at the last sample of each group of tied scores
+    is_thresh = np.ones(scores.shape, dtype=bool)
+    is_thresh[:, :-1] = scores[:, :-1] != scores[:, 1:]
+    # Trapezoidal AUC between each threshold and the previous one
+    thresh_pos = np.where(is_thresh, np.arange(scores.shape[1]), -1)
+    prev_pos = np.full(scores.shape, -1)
+    prev_pos[:, 1:] = np.maximum.accumulate(thresh_pos, axis=1)[:, :-1]
+    has_prev = prev_pos >= 0
+    prev_pos[~has_prev] = 0
+    prev_tpr = np.where(has_prev, np.take_along_axis(tpr, prev_pos, axis=1), 0)
+    prev_fpr = np.where(has_prev, np.take_along_axis(fpr, prev_pos, axis=1), 0)
+    areas = (fpr - prev_fpr) * (tpr + prev_tpr) / 2
+    aucs = np.sum(areas * is_thresh, axis=1)
+    # Each curve starts at the origin
+    fprs = np.concatenate([np.zeros(n_btstp), fpr[is_thresh]])
+    tprs = np.concatenate([np.zeros(n_btstp), tpr[is_thresh]])
+    return fprs, tprs, aucs
+
+
 def roc_from_df(df, ci=None):
     """
     Helper function to compute ROC curves using pandas.groupby(). Confidence intervals
@@ -205,12 +280,8 @@ def roc_from_df(df, ci=None):
     (95 would be 95%). If None, confidence intervals are not computed.
     :return dataframe rate_df: dataframe contains ROC curves for each condition
     """
-    aucs = []
     n_btstp = 1000
     s = {}
-    fprs = []
-    tprs = []
-    thrs = []
     y_test = df['serum type'] == 'positive'
     y_prob = df['OD']
     s['False positive rate'], s['True positive rate'], s['threshold'] = \
@@ -224,19 +295,11 @@ def roc_from_df(df, ci=None):
     if ci is None:
         return pd.Series(s)
     else:
-        for i in range(n_btstp):
-            df_rsmpl = resample(df, n_samples=len(df), stratify=df['serum type'])
-            y_test = df_rsmpl['serum type'] == 'positive'
-            y_prob = df_rsmpl['OD']
-            fpr_tmp, tpr_tmp, thr_tmp = \
-                roc_curve(y_test, y_prob, pos_label=1, drop_intermediate=False)
-            fprs += fpr_tmp.tolist()
-            tprs += tpr_tmp.tolist()
-            thrs += thr_tmp.tolist()
-            try:
-                aucs.append(roc_auc_score(y_test, y_prob))
-            except ValueError as err:
-                aucs.append(np.nan)
+        fprs, tprs, aucs = bootstrap_roc(
+            y_test.to_numpy(),
+            y_prob.to_numpy(),
+            n_btstp=n_btstp,
+        )
         rate_df = pd.DataFrame({'False positive rate': fprs, 'tpr': tprs})
         rate_df = rate_df.groupby('False positive rate').apply(
             lambda x: roc_ci(x, ci)).reset_index()
@@ -247,12 +310,14 @@ def roc_from_df(df, ci=None):
         rate_df['auc_ci_high'] = auc_high
         return rate_df
 
-def get_roc_df(df, ci=None):
+def get_roc_df(df, ci=None, n_jobs=-1):
     """
-    Generate ROC curves for serum samples
+    Generate ROC curves for serum samples. Each condition is independent,
+    so their ROC curves are computed in parallel.
     :param dataframe df: dataframe containing serum OD info
     :param int or None ci: Confidence interval of the ROC curves in the unit of percent
     (95 would be 95%). If None, confidence intervals are not computed.
+    :param int n_jobs: Number of parallel jobs, -1 uses all CPUs
     :return dataframe roc_df: dataframe contains ROC curves for each condition
     """
     df = df[df['serum type'].isin(['positive', 'negative'])]
@@ -262,10 +327,21 @@ def get_roc_df(df, ci=None):
                  'secondary dilution',
                  'OD',
                  'pipeline']]
-    roc_df = roc_df.groupby(['antigen',
-                             'secondary ID',
-                             'secondary dilution',
-                             'pipeline']).apply(lambda x: roc_from_df(x, ci))
+    group_cols = ['antigen',
+                  'secondary ID',
+                  'secondary dilution',
+                  'pipeline']
+    groups = list(roc_df.groupby(group_cols))
+    group_keys = [key for key, _ in groups]
+    roc_list = Parallel(n_jobs=n_jobs)(
+        delayed(roc_from_df)(group_df, ci) for _, group_df in groups)
+    if ci is None:
+        roc_df = pd.DataFrame(
+            roc_list,
+            index=pd.MultiIndex.from_tuples(group_keys, names=group_cols),
+        )
+    else:
+        roc_df = pd.concat(roc_list, keys=group_keys, names=group_cols)
     # roc_df = roc_df.reset_index()
     roc_df = roc_df.apply(pd.Series.explode).astype(float).reset_index()
     roc_df.dropna(inplace=True)
@@ -404,8 +480,12 @@ def joint_plot(df_ori,
             n_levels=60,
             xlim=None,
             ylim=None,
+            gridsize=256,
             ):
-    """ Join distribution plot"""
+    """ Join distribution plot
+
+    :param int gridsize: Number of points per axis in the 2D KDE evaluation grid
+    """
 
     # g = sns.JointGrid(x=x_col, y=y_col, data=df)
     #                   # xlim=(0, 50), ylim=(0, 8))
@@ -417,8 +497,6 @@ def joint_plot(df_ori,
     mae = diff_df.abs().mean()
     # cmap = sns.cubehelix_palette(as_cmap=True, dark=0, light=1, reverse=False)
     cmap = 'Blues'
-    fig = plt.figure()
-    fig.set_size_inches((9, 9))
     g = sns.JointGrid(x_col, y_col, df,
                 xlim=xlim, ylim=ylim)
     hue_vals = []
@@ -427,7 +505,7 @@ def joint_plot(df_ori,
         sns.kdeplot(hue_df[x_col], ax=g.ax_marg_x, legend=False, bw=bw)
         sns.kdeplot(hue_df[y_col], ax=g.ax_marg_y, vertical=True, legend=False, bw=bw)
         sns.kdeplot(hue_df[x_col], hue_df[y_col], ax=g.ax_joint,
-                     legend=True, gridsize=400, bw=bw, n_levels=n_levels, shade=True, cmap=cmap)
+                     legend=True, gridsize=gridsize, bw=bw, n_levels=n_levels, shade=True, cmap=cmap)
     xfit = np.linspace(xlim[0], xlim[1], 2)
     g.ax_joint.plot(xfit, xfit, linewidth=5, color='k', linestyle='--', alpha=0.5)
     g.ax_joint.text(0.7 * xlim[1], 0.15 * ylim[1], 'Bias={:.3f}'.format(me), fontsize=16)  # add text
@@ -436,6 +514,7 @@ def joint_plot(df_ori,
     plt.legend(hue_vals, loc='upper left')
     plt.savefig(os.path.join(output_path, ''.join([output_fname, '.jpg'])),
                 dpi=300, bbox_inches='tight')
+    plt.close(g.fig)
 
 
 def standard_curve_plot(dilution_df, fig_path, fig_name, ext, hue=None,
@@ -451,7 +530,7 @@ def standard_curve_plot(dilution_df, fig_path, fig_name, ext, hue=None,
     :param bool zoom: If true, output zoom-in of the low OD region
     """
     dilution_df_fit = dilution_df.copy()
-    dilution_df_fit = fit2df(dilution_df_fit, fourPL)
+    dilution_df_fit = fit2df(dilution_df_fit, fourPL, fourPL_jac)
     sera_fit_list = dilution_df['serum ID'].unique()
     #%% plot standard curves
     sera_4pl_list = [' '.join([x, 'fit']) for x in sera_fit_list]
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import array_analyzer.extract.background_estimator as background_estimator
+
+
+@pytest.fixture
+def bg_estimator():
+    return background_estimator.BackgroundEstimator2D(
+        block_size=10,
+        order=2,
+        normalize=False,
+    )
+
+
+def test_sample_block_medians(bg_estimator):
+    im = np.zeros((35, 42), dtype=np.uint16)
+    # Give each 10 x 10 block a unique value
+    for x in range(3):
+        for y in range(4):
+            im[x * 10:(x + 1) * 10, y * 10:(y + 1) * 10] = 10 * x + y
+    coords, values = bg_estimator.sample_block_medians(im)
+    assert coords.shape == (12, 2)
+    assert values.shape == (12,)
+    for y in range(4):
+        for x in range(3):
+            idx = y * 3 + x
+            assert coords[idx, 0] == x * 10 + 4.5
+            assert coords[idx, 1] == y * 10 + 4.5
+            assert values[idx] == 10 * x + y
+
+
+def test_fit_polynomial_surface_2d(bg_estimator):
+    im_shape = (60, 80)
+    rows, cols = np.meshgrid(
+        np.arange(im_shape[0]),
+        np.arange(im_shape[1]),
+        indexing='ij',
+    )
+    surface = 1. + .01 * rows - .02 * cols + .001 * rows * cols - .0005 * rows ** 2
+    coords, values = bg_estimator.sample_block_medians(surface)
+    poly_surface = bg_estimator.fit_polynomial_surface_2d(
+        sample_coords=coords,
+        sample_values=values,
+        im_shape=im_shape,
+    )
+    assert poly_surface.shape == im_shape
+    np.testing.assert_allclose(poly_surface, surface, atol=.01)
+
+
+def test_fit_polynomial_surface_2d_high_order():
+    bg_estimator = background_estimator.BackgroundEstimator2D(
+        block_size=64,
+        order=4,
+        normalize=False,
+    )
+    im_shape = (2048, 2048)
+    rows, cols = np.meshgrid(
+        np.linspace(-1, 1, im_shape[0]),
+        np.linspace(-1, 1, im_shape[1]),
+        indexing='ij',
+    )
+    surface = 1. + .3 * rows ** 4 - .2 * rows * cols ** 3 + .1 * cols ** 2
+    coords, values = bg_estimator.sample_block_medians(surface)
+    poly_surface = bg_estimator.fit_polynomial_surface_2d(
+        sample_coords=coords,
+        sample_values=values,
+        im_shape=im_shape,
+    )
+    np.testing.assert_allclose(poly_surface, surface, atol=1e-3)
+
+
+def test_get_background_normalize():
+    bg_estimator = background_estimator.BackgroundEstimator2D(
+        block_size=10,
+        order=1,
+        normalize=True,
+    )
+    im = np.zeros((40, 50)) + 2.
+    background = bg_estimator.get_background(im)
+    assert background.shape == im.shape
+    np.testing.assert_allclose(background, 1.)
+
+
+def test_get_background_float32(bg_estimator):
+    im = np.zeros((40, 50), dtype=np.float32) + .5
+    background = bg_estimator.get_background(im)
+    assert background.dtype == np.float32
+    np.testing.assert_allclose(background, .5, rtol=1e-5)
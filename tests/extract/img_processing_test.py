@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import array_analyzer.extract.img_processing as img_processing
+
+
+@pytest.fixture
+def spot_image():
+    """
+    Bright uint16 image with a 3 x 3 grid of dark Gaussian spots.
+    """
+    im_shape = (400, 450)
+    rows, cols = np.meshgrid(
+        np.arange(im_shape[0]),
+        np.arange(im_shape[1]),
+        indexing='ij',
+    )
+    spot_coords = []
+    im = np.zeros(im_shape) + 40000
+    for row in (100, 200, 300):
+        for col in (120, 220, 320):
+            spot_coords.append([row, col])
+            im -= 30000 * np.exp(-((rows - row) ** 2 + (cols - col) ** 2) / (2 * 12 ** 2))
+    return im.astype(np.uint16), np.array(spot_coords)
+
+
+def test_get_spot_coords(spot_image):
+    im, expected_coords = spot_image
+    imaging_params = {
+        'spot_width': .2,
+        'pixel_size': .0049,
+        'rows': 3,
+        'columns': 3,
+    }
+    spot_detector = img_processing.SpotDetector(imaging_params=imaging_params)
+    spot_coords = spot_detector.get_spot_coords(im, max_intensity=65535)
+    assert spot_coords.dtype == np.float32
+    assert spot_coords.shape == (9, 2)
+    # Match each expected spot with its nearest detected spot
+    for coord in expected_coords:
+        dists = np.linalg.norm(spot_coords - coord, axis=1)
+        assert np.min(dists) < 2
+
+
+def test_get_spot_coords_margin(spot_image):
+    im, _ = spot_image
+    imaging_params = {
+        'spot_width': .2,
+        'pixel_size': .0049,
+        'rows': 3,
+        'columns': 3,
+    }
+    spot_detector = img_processing.SpotDetector(imaging_params=imaging_params)
+    spot_coords = spot_detector.get_spot_coords(
+        im,
+        margin=110,
+        max_intensity=65535,
+    )
+    # Only the center row is outside the margin (image has 400 rows, 450 cols)
+    assert spot_coords.shape == (3, 2)
+    np.testing.assert_allclose(spot_coords[:, 0], 200, atol=2)
+    np.testing.assert_allclose(
+        np.sort(spot_coords[:, 1]),
+        [120, 220, 320],
+        atol=2,
+    )
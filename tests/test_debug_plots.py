@@ -1,9 +1,42 @@
+import cv2 as cv
+import numpy as np
+import os
 import pytest
 
 import array_analyzer.load as load
-import os
+import array_analyzer.load.debug_plots as debug_plots
 
 
 def test_nonetype_integration():
     pass
 
+
+def test_plot_background_overlay(tmp_path):
+    im = np.zeros((20, 30), dtype=np.float32) + .5
+    im[5:10, 5:10] = 1.
+    background = np.zeros((20, 30)) + .25
+    output_name = os.path.join(tmp_path, 'A1')
+    debug_plots.plot_background_overlay(im, background, output_name)
+    im_overlay = cv.imread(output_name + '_crop_bg_overlay.png')
+    im_stack = np.stack([background, im, background], axis=2)
+    np.testing.assert_array_equal(im_overlay, (255 * im_stack).astype('uint8'))
+
+
+def test_plot_registration(tmp_path):
+    im = np.zeros((300, 400), dtype=np.uint16) + 1000
+    spot_coords = np.array([[100, 120], [150, 200]], dtype=np.float32)
+    grid_coords = np.array([[102, 118], [149, 203], [200, 250]])
+    reg_coords = np.array([[101., 119.], [150., 201.], [199., 251.]])
+    output_name = os.path.join(tmp_path, 'A1')
+    debug_plots.plot_registration(
+        im,
+        spot_coords,
+        grid_coords,
+        reg_coords,
+        output_name,
+        max_intensity=65535,
+    )
+    assert os.path.isfile(output_name + '_registration.png')
+    # Input coordinates are left unchanged
+    np.testing.assert_array_equal(spot_coords, [[100, 120], [150, 200]])
+    np.testing.assert_array_equal(reg_coords[2], [199., 251.])
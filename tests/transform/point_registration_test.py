@@ -44,6 +44,7 @@ def test_create_reference_grid(register_inst):
 def test_create_gaussian_particles(register_inst):
     particles = register_inst.create_gaussian_particles()
     assert particles.shape == (100, 4)
+    assert particles.dtype == np.float32
     particle_means = np.mean(particles, 0)
     assert -.5 < particle_means[0] < .5
     assert -.5 < particle_means[1] < .5
@@ -63,6 +64,17 @@ def test_get_translation_matrix(register_inst):
     assert t_matrix[0, 1] == 2
 
 
+def test_get_translation_matrices(register_inst):
+    particles = np.array([[20, 50, 90, 2], [1, 2, 30, .5]], dtype=np.float64)
+    t_matrices = register_inst.get_translation_matrices(particles)
+    assert t_matrices.shape == (2, 2, 3)
+    for p, particle in enumerate(particles):
+        np.testing.assert_array_almost_equal(
+            t_matrices[p],
+            register_inst.get_translation_matrix(particle),
+        )
+
+
 def test_particle_filter(register_inst):
     register_inst.particle_filter(max_iter=5)
     assert 3.5 < register_inst.registered_dist < 4
@@ -128,3 +140,14 @@ def test_check_reg_coords_already_false(register_inst):
     register_inst.registration_ok = False
     reg_ok = register_inst.check_reg_coords()
     assert reg_ok is False
+
+
+def test_create_grid_template():
+    grid_template = registration.create_grid_template(
+        nbr_grid_rows=2,
+        nbr_grid_cols=3,
+        spot_dist=np.uint8(10),
+    )
+    assert grid_template.shape == (6, 2)
+    np.testing.assert_array_equal(grid_template[:, 0], [-5, -5, -5, 5, 5, 5])
+    np.testing.assert_array_equal(grid_template[:, 1], [-10, 0, 10, -10, 0, 10])
@@ -1,3 +1,4 @@
+import cv2 as cv
 import numpy as np
 import os
 import pytest
@@ -51,6 +52,15 @@ def test_get_image_paths(image_dir):
         assert im_name == key + '.png'
 
 
+def test_get_image_paths_ignore_other_files(tmp_path):
+    im = np.zeros((5, 10), dtype=np.uint8)
+    for im_name in ['B3.png', 'A10.tif', 'A1_crop.png', 'Z1.png', 'A2.jpg']:
+        cv.imwrite(os.path.join(tmp_path, im_name), im)
+    well_images = io_utils.get_image_paths(str(tmp_path))
+    assert list(well_images) == ['A10', 'B3']
+    assert well_images['B3'] == os.path.join(tmp_path, 'B3.png')
+
+
 def test_get_mm_image_paths(micromanager_dir):
     well_images = io_utils.get_image_paths(micromanager_dir)
     assert len(well_images) == 4